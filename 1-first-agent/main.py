@@ -1,14 +1,32 @@
-import asana
-from asana.rest import ApiException
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APIConnectionError
 from dotenv import load_dotenv
 from datetime import datetime
 import json
 import os
 import logging
-
-# Set system prompt for agent
-system_prompt = f"You are an experienced project manager at Fewa, a dynamic startup. Your role is to assist users in breaking down their projects into actionable tasks, prioritizing them effectively, and creating well-structured tickets in Asana. Provide clear task descriptions, assign priority levels using the MoSCoW method, suggest aggressive yet realistic deadlines with buffer times, and categorize tasks based on user requirements and project objectives. Ensure tasks are concise, actionable, and aligned with the user's overall goals. Embody the 'move fast and break nothing' philosophy by incorporating feature flags for direct production deployment, including clear communication details, automating repetitive steps, ensuring quality assurance through code reviews, managing dependencies, efficiently tracking time, documenting changes, and utilizing predefined templates for quick task creation. The current date is: {datetime.now().date()}"
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+# The apps run from inside their own folders (see Justfile), so put the repo
+# root on the path to reach the shared core package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.asana_tool import create_asana_task as _create_asana_task, tool_executor
+from core.llm import (
+    cache_get,
+    cache_key,
+    cache_set,
+    clear_token_count_cache,
+    count_tokens,
+    http_client,
+    rate_limiter,
+    warm_connections,
+)
+from core.prompt import SYSTEM_PROMPT_STATIC, TOOLS_SCHEMA
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,8 +36,11 @@ logger = logging.getLogger(__name__)
 # Handle env variables
 # --------------------------------------------------------------
 
-# Load environment variables
-load_dotenv()
+# .env parsing does disk I/O and parsing work on every process start;
+# production deployments get their environment from the orchestrator, so
+# only dev loads the file
+if os.getenv("APP_ENV", "dev") == "dev":
+    load_dotenv()
 
 # Validate and retrieve environment variables
 openai_model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
@@ -38,17 +59,102 @@ if not asana_project_id:
     exit(1)
 
 # --------------------------------------------------------------
-# Configuration setup for OpenAI and Asana
+# Configuration setup for OpenAI
+# --------------------------------------------------------------
+
+# Initialize OpenAI client on the shared pooled HTTP client so connections
+# established by the startup warmup are reused by later completions calls
+client = OpenAI(api_key=openai_api_key, http_client=http_client)
+
+# --------------------------------------------------------------
+# Conversation compaction
 # --------------------------------------------------------------
 
-# Initialize OpenAI client
-client = OpenAI(api_key=openai_api_key)
+# Re-sending the full history every turn makes total billed tokens grow
+# O(N^2) with conversation length. Once the history crosses the budget,
+# older turns are folded into a one-message summary; the system prompt and
+# the most recent messages stay verbatim.
+MAX_HISTORY_TOKENS = 8000
+KEEP_RECENT_MESSAGES = 6
+
+def compact_messages(messages: list) -> list:
+    """
+    Folds older turns into a short summary once the history exceeds the budget.
+
+    Args:
+        messages (list): Full conversation, system prompt first.
+
+    Returns:
+        list: The original list if under budget, otherwise a new list of
+        [system prompt, summary message, recent messages verbatim].
+    """
+    total_tokens = sum(count_tokens(m) for m in messages)
+    if total_tokens <= MAX_HISTORY_TOKENS or len(messages) <= KEEP_RECENT_MESSAGES + 1:
+        return messages
+
+    recent_start = len(messages) - KEEP_RECENT_MESSAGES
+    # Never split a tool round: a tool result whose assistant tool-call
+    # message was summarized away would be rejected by the API.
+    while recent_start > 1 and (
+        isinstance(messages[recent_start], dict)
+        and messages[recent_start].get("role") == "tool"
+    ):
+        recent_start -= 1
+
+    older_messages = messages[1:recent_start]
+
+    try:
+        summary_response = create_completion(
+            model=openai_model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Summarize the following conversation between a user and a project-management assistant. Keep task names, due dates, IDs, and decisions. Stay under 300 words."
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps(older_messages, default=str)
+                }
+            ]
+        )
+        summary = summary_response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"History compaction failed, keeping full history: {e}")
+        return messages
 
-# Initialize Asana client
-configuration = asana.Configuration()
-configuration.access_token = asana_access_token
-api_client = asana.ApiClient(configuration)
-tasks_api_instance = asana.TasksApi(api_client)
+    # Compaction is rare; dropping the memo wholesale keeps it from holding
+    # on to content of summarized-away messages
+    clear_token_count_cache()
+
+    return [
+        messages[0],
+        {"role": "system", "content": f"Summary of earlier conversation: {summary}"}
+    ] + messages[recent_start:]
+
+# --------------------------------------------------------------
+# Rate-limited completion entry point
+# --------------------------------------------------------------
+
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(6)
+)
+def create_completion(**kwargs):
+    """
+    Rate-limited chat-completion call with exponential-backoff retries.
+
+    All OpenAI completion traffic funnels through here so the limiter sees
+    every request; 429s and connection errors are retried with jitter.
+
+    Args:
+        **kwargs: Arguments forwarded to client.chat.completions.create.
+
+    Returns:
+        The completion (or stream) returned by the SDK.
+    """
+    rate_limiter.wait(sum(count_tokens(m) for m in kwargs["messages"]))
+    return client.chat.completions.create(**kwargs)
 
 # --------------------------------------------------------------
 # Business logic for AI agent
@@ -65,31 +171,7 @@ def create_asana_task(task_name: str, due_on: str = "today") -> str:
     Returns:
         str: JSON response from Asana API or an error message.
     """
-    try:
-        if due_on.lower() == "today":
-            due_on = str(datetime.now().date())
-        else:
-            datetime.strptime(due_on, "%Y-%m-%d")
-
-        task_body = {
-            "data": {
-                "name": task_name,
-                "due_on": due_on,
-                "projects": [asana_project_id]
-            }
-        }
-
-        api_response = tasks_api_instance.create_task(task_body, {})
-        return json.dumps(api_response, indent=2)
-    except ValueError:
-        logger.error(f"Invalid date format for due_on: {due_on}")
-        return "Invalid date format for due_on."
-    except ApiException as e:
-        logger.error(f"API Exception: {e}")
-        return f"API Exception: {e}"
-    except Exception as e:
-        logger.error(f"Unknown error: {e}")
-        return f"Unknown error: {e}"
+    return _create_asana_task(task_name, asana_project_id, due_on)
 
 def get_tools() -> list:
     """
@@ -98,94 +180,217 @@ def get_tools() -> list:
     Returns:
         list: List of tool descriptions.
     """
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "create_asana_task",
-                "description": "Creates a task in Asana given the name of the task and when it is due",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task_name": {
-                            "type": "string",
-                            "description": "The name of the task in Asana"
-                        },
-                        "due_on": {
-                            "type": "string",
-                            "description": "The date the task is due in the format YYYY-MM-DD. If not given, the current day is used"
-                        },
-                    },
-                    "required": ["task_name"]
-                },
-            },
-        }
-    ]
-    return tools
+    return TOOLS_SCHEMA
+
+def stream_completion(request_messages: list, tools: list = None) -> tuple:
+    """
+    Streams a chat completion, printing content tokens as they arrive.
+
+    Args:
+        request_messages (list): Messages to send to the model.
+        tools (list, optional): Tool schema to expose. Defaults to None.
+
+    Returns:
+        tuple: (content, tool_calls) where content is the accumulated reply
+        and tool_calls is a list of assistant tool-call dicts or None.
+    """
+    kwargs = {
+        "model": openai_model,
+        "messages": request_messages,
+        "stream": True
+    }
+    if tools:
+        kwargs["tools"] = tools
+        kwargs["tool_choice"] = "auto"
+
+    content_parts = []
+    tool_calls_by_index = {}
+
+    for chunk in create_completion(**kwargs):
+        if not chunk.choices:
+            continue
+
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            content_parts.append(delta.content)
+            print(delta.content, end="", flush=True)
+
+        # Tool calls arrive as fragments keyed by index; stitch the id, name,
+        # and argument string back together as the chunks come in.
+        for tool_call in delta.tool_calls or []:
+            entry = tool_calls_by_index.setdefault(tool_call.index, {
+                "id": "",
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if tool_call.id:
+                entry["id"] = tool_call.id
+            if tool_call.function:
+                if tool_call.function.name:
+                    entry["function"]["name"] = tool_call.function.name
+                if tool_call.function.arguments:
+                    entry["function"]["arguments"] += tool_call.function.arguments
+
+    if content_parts:
+        print(flush=True)
+
+    content = "".join(content_parts)
+    tool_calls = [tool_calls_by_index[i] for i in sorted(tool_calls_by_index)]
+    return content, tool_calls or None
 
 def prompt_ai(messages: list) -> str:
     """
     Prompts the AI with the conversation messages and handles tool calls if necessary.
 
+    Streams the reply to stdout as tokens arrive instead of waiting for the
+    full completion, so time-to-first-token stays in the hundreds of ms.
+
     Args:
         messages (list): List of conversation messages.
 
     Returns:
         str: AI's response content.
     """
+    # The current date rides along as a trailing system reminder instead of
+    # living in messages[0], so the cached prefix never changes at midnight.
+    date_reminder = {
+        "role": "system",
+        "content": f"Current date: {datetime.now().date()}"
+    }
+
     try:
-        completion = client.chat.completions.create(
-            model=openai_model,
-            messages=messages,
-            tools=get_tools()
+        key = cache_key(openai_model, messages + [date_reminder], get_tools())
+        cached_response = cache_get(key)
+        if cached_response is not None:
+            print(cached_response, flush=True)
+            return cached_response
+
+        content, tool_calls = stream_completion(
+            messages + [date_reminder], get_tools()
         )
 
-        response_message = completion.choices[0].message
-        tool_calls = response_message.tool_calls
-
         if tool_calls:
             available_functions = {
                 "create_asana_task": create_asana_task
             }
 
-            messages.append(response_message)
+            messages.append({
+                "role": "assistant",
+                "content": content or None,
+                "tool_calls": tool_calls
+            })
 
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions[function_name]
+            def dispatch(tool_call):
+                function_name = tool_call["function"]["name"]
+                function_to_call = available_functions.get(function_name)
 
                 if not function_to_call:
                     logger.warning(f"Function {function_name} not available.")
-                    continue
+                    return f"Function {function_name} not available."
+
+                function_args = json.loads(tool_call["function"]["arguments"])
+                return function_to_call(**function_args)
 
-                function_args = json.loads(tool_call.function.arguments)
-                function_response = function_to_call(**function_args)
+            # Fan the tool calls out across threads so N Asana round trips run
+            # concurrently, then append the results in the original order.
+            function_responses = tool_executor.map(dispatch, tool_calls)
 
+            for tool_call, function_response in zip(tool_calls, function_responses):
                 messages.append({
-                    "tool_call_id": tool_call.id,
+                    "tool_call_id": tool_call["id"],
                     "role": "tool",
-                    "name": function_name,
+                    "name": tool_call["function"]["name"],
                     "content": function_response
                 })
 
-            second_response = client.chat.completions.create(
-                model=openai_model,
-                messages=messages,
-            )
-            return second_response.choices[0].message.content
+            second_content, _ = stream_completion(messages + [date_reminder])
+            return second_content
 
         else:
-            return response_message.content
+            # Only side-effect-free turns are cached; tool rounds create
+            # Asana objects and must never be replayed from the cache.
+            cache_set(key, content)
+            return content
 
     except Exception as e:
         logger.error(f"Unknown error: {e}")
         return f"Unknown error: {e}"
 
+# --------------------------------------------------------------
+# Offline batch planning
+# --------------------------------------------------------------
+
+def plan_project_batch(task_prompts: list, poll_interval: int = 60) -> list:
+    """
+    Expands many planning prompts offline via the OpenAI Batch API.
+
+    Not for the interactive loop: batches complete within 24 hours at half
+    the cost of synchronous requests and with higher rate limits, which suits
+    non-interactive workloads like breaking a large project spec into dozens
+    of tasks overnight.
+
+    Args:
+        task_prompts (list): One user prompt per item to expand.
+        poll_interval (int, optional): Seconds between status polls. Defaults to 60.
+
+    Returns:
+        list: Response content strings in the same order as task_prompts.
+    """
+    batch_lines = [
+        {
+            "custom_id": f"task-{index}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": openai_model,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT_STATIC},
+                    {"role": "user", "content": prompt}
+                ]
+            }
+        }
+        for index, prompt in enumerate(task_prompts)
+    ]
+
+    with tempfile.NamedTemporaryFile("w+b", suffix=".jsonl") as batch_file:
+        batch_file.write(
+            "\n".join(json.dumps(line) for line in batch_lines).encode()
+        )
+        batch_file.flush()
+        batch_file.seek(0)
+        input_file = client.files.create(file=batch_file, purpose="batch")
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(batch_lines)} requests.")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} finished with status {batch.status}")
+
+    responses_by_id = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        result = json.loads(line)
+        responses_by_id[result["custom_id"]] = (
+            result["response"]["body"]["choices"][0]["message"]["content"]
+        )
+
+    return [responses_by_id.get(f"task-{index}") for index in range(len(task_prompts))]
+
 def main():
+    warm_connections()
+
     messages = [
         {
             "role": "system",
-            "content": system_prompt
+            "content": SYSTEM_PROMPT_STATIC
         }
     ]
 
@@ -196,10 +401,14 @@ def main():
                 break
 
             messages.append({"role": "user", "content": user_input})
+
+            # prompt_ai streams the response to stdout as it is generated
+            print("\nAI Response:")
             ai_response = prompt_ai(messages)
+            print()
 
-            print(f"\nAI Response:\n{ai_response}\n")
             messages.append({"role": "assistant", "content": ai_response})
+            messages = compact_messages(messages)
 
     except KeyboardInterrupt:
         logger.info("User requested exit.")
@@ -207,4 +416,4 @@ def main():
         logger.error(f"An unexpected error occurred: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
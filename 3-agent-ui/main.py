@@ -1,24 +1,31 @@
-import asana
-from asana.rest import ApiException
-from openai import OpenAI
 from dotenv import load_dotenv
-from datetime import datetime
+from pathlib import Path
 import streamlit as st
-import json
 import os
+import sys
 
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
 
-# Set system prompt for agent
-system_prompt = f"You are an experienced project manager at Fewa, a dynamic startup. Your role is to assist users in breaking down their projects into actionable tasks, prioritizing them effectively, and creating well-structured tickets in Asana. Provide clear task descriptions, assign priority levels using the MoSCoW method, suggest aggressive yet realistic deadlines with buffer times, and categorize tasks based on user requirements and project objectives. Ensure tasks are concise, actionable, and aligned with the user's overall goals. Embody the 'move fast and break nothing' philosophy by incorporating feature flags for direct production deployment, including clear communication details, automating repetitive steps, ensuring quality assurance through code reviews, managing dependencies, efficiently tracking time, documenting changes, and utilizing predefined templates for quick task creation. The current date is: {datetime.now().date()}"
+# The apps run from inside their own folders (see Justfile), so put the repo
+# root on the path to reach the shared core package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.asana_tool import create_asana_task as _create_asana_task, tool_executor
+from core.history import compact_messages, with_date_reminder
+from core.llm import http_client, warm_connections
+from core.prompt import cacheable_system_content
 
 # --------------------------------------------------------------
 # Handle env variables
 # --------------------------------------------------------------
-load_dotenv()
+# .env parsing does disk I/O and parsing work on every process start;
+# production deployments get their environment from the orchestrator, so
+# only dev loads the file
+if os.getenv("APP_ENV", "dev") == "dev":
+    load_dotenv()
 
 # Validate and retrieve environment variables
 llm_model = os.getenv('LLM_MODEL', 'gpt-4o-mini')
@@ -27,13 +34,9 @@ anthropic_api_key = os.getenv('ANTHROPIC_API_KEY', '')
 asana_access_token = os.getenv('ASANA_ACCESS_TOKEN', '')
 asana_project_id = os.getenv('ASANA_PROJECT_ID', '')
 
-# --------------------------------------------------------------
-# Configuration setup for Asana
-# --------------------------------------------------------------
-configuration = asana.Configuration()
-configuration.access_token = asana_access_token
-api_client = asana.ApiClient(configuration)
-tasks_api_instance = asana.TasksApi(api_client)
+# Static system prompt, marked as a cache breakpoint for Claude models so
+# provider prompt caches hit (OpenAI caches stable prefixes automatically)
+system_message_content = cacheable_system_content(llm_model)
 
 # --------------------------------------------------------------
 # Business logic for AI agent
@@ -52,86 +55,82 @@ def create_asana_task(task_name, due_on="today"):
     Returns:
         str: The API response of adding the task to Asana or an error message if the API call threw an error
     """
-    if due_on == "today":
-        due_on = str(datetime.now().date())
-
-    task_body = {
-        "data": {
-            "name": task_name,
-            "due_on": due_on,
-            "projects": [asana_project_id]
-        }
-    }
+    return _create_asana_task(task_name, asana_project_id, due_on)
 
-    try:
-        api_response = tasks_api_instance.create_task(task_body, {})
-        return json.dumps(api_response, indent=2)
-    except ApiException as e:
-        return f"Exception when calling TasksApi->create_task: {e}"  
 
+# Built once at module load: constructing the client re-parses tool schemas
+# and re-creates the underlying HTTP connection pool, so reusing one instance
+# keeps pooled connections warm across turns (and across nested tool rounds).
+asana_chatbot = ChatOpenAI(model=llm_model, http_client=http_client) if "gpt" in llm_model.lower() else ChatAnthropic(model=llm_model)
+asana_chatbot_with_tools = asana_chatbot.bind_tools([create_asana_task])
 
-def prompt_ai(messages, nested_calls=0):
-    if nested_calls > 5:
-        raise "AI is tool calling too much!"
 
-    # First, prompt the AI with the latest user message
-    tools = [create_asana_task]
-    asana_chatbot = ChatOpenAI(model=llm_model) if "gpt" in llm_model.lower() else ChatAnthropic(model=llm_model)
-    asana_chatbot_with_tools = asana_chatbot.bind_tools(tools)
 
-    stream = asana_chatbot_with_tools.stream(messages)
-    first = True
-    for chunk in stream:
-        if first:
-            gathered = chunk
-            first = False
-        else:
-            gathered = gathered + chunk
+def prompt_ai(messages):
+    available_functions = {
+        "create_asana_task": create_asana_task
+    }
+
+    # Tool rounds run in a bounded loop rather than through recursion, so the
+    # Python stack stays flat and hitting the limit raises a real exception
+    for _ in range(6):
+        # The current date rides along per-request instead of living in
+        # messages[0], so the cached prefix never changes at midnight.
+        request_messages = with_date_reminder(messages, llm_model)
 
-        yield chunk
+        stream = asana_chatbot_with_tools.stream(request_messages)
+        first = True
+        for chunk in stream:
+            if first:
+                gathered = chunk
+                first = False
+            else:
+                gathered = gathered + chunk
 
-    has_tool_calls = len(gathered.tool_calls) > 0
+            yield chunk
 
-    # Second, see if the AI decided it needs to invoke a tool
-    if has_tool_calls:
-        # If the AI decided to invoke a tool, invoke it
-        available_functions = {
-            "create_asana_task": create_asana_task
-        }
+        # If the AI decided it does not need a tool, this is the final answer
+        if not gathered.tool_calls:
+            return
 
         # Add the tool request to the list of messages so the AI knows later it invoked the tool
         messages.append(gathered)
 
+        # Next, fan the tool calls out across threads so N Asana round trips
+        # run concurrently, then add the results in the original order
+        tool_outputs = tool_executor.map(
+            lambda tool_call: available_functions[tool_call["name"].lower()].invoke(tool_call["args"]),
+            gathered.tool_calls
+        )
 
-        # Next, for each tool the AI wanted to call, call it and add the tool result to the list of messages
-        for tool_call in gathered.tool_calls:
-            tool_name = tool_call["name"].lower()
-            selected_tool = available_functions[tool_name]
-            tool_output = selected_tool.invoke(tool_call["args"])
-            messages.append(ToolMessage(tool_output, tool_call_id=tool_call["id"]))                
+        for tool_call, tool_output in zip(gathered.tool_calls, tool_outputs):
+            messages.append(ToolMessage(tool_output, tool_call_id=tool_call["id"]))
 
-        # Call the AI again so it can produce a response with the result of calling the tool(s)
-        additional_stream = prompt_ai(messages, nested_calls + 1)
-        for additional_chunk in additional_stream:
-            yield additional_chunk
+    raise RuntimeError("AI is tool calling too much!")
 
 
 def main():
     st.title("💬 Asana Chatbot")
+
+    # Streamlit reruns main() on every interaction; only warm once per session
+    if "warmed_connections" not in st.session_state:
+        warm_connections()
+        st.session_state.warmed_connections = True
     st.caption(f"🚀 A productivity agent powered by {llm_model}")
 
     if "messages" not in st.session_state:
         st.session_state.messages = [
-            SystemMessage(content=system_prompt)
-        ]  
+            SystemMessage(content=system_message_content)
+        ]
+        # Pre-rendered (type, content) pairs for the display loop: Streamlit
+        # reruns main() on every interaction, and round-tripping each message
+        # through model_dump_json() re-serialized the whole history each time
+        st.session_state.rendered = []
 
     # Display chat messages from history on app rerun
-    for message in st.session_state.messages:
-        message_json = json.loads(message.model_dump_json())
-        message_type = message_json["type"]
-        if message_type in ["human", "ai"]:
-            with st.chat_message(message_type):
-                st.markdown(message_json["content"])  
+    for rendered_message in st.session_state.rendered:
+        with st.chat_message(rendered_message["type"]):
+            st.markdown(rendered_message["content"])
 
     # React to user input
     if prompt := st.chat_input("What is your next milestone?"):
@@ -139,13 +138,16 @@ def main():
         st.chat_message("user").markdown(prompt)
         # Add user message to chat history
         st.session_state.messages.append(HumanMessage(content=prompt))
+        st.session_state.rendered.append({"type": "human", "content": prompt})
 
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
             stream = prompt_ai(st.session_state.messages)
             response = st.write_stream(stream)
-        
+
         st.session_state.messages.append(AIMessage(content=response))
+        st.session_state.rendered.append({"type": "ai", "content": response})
+        st.session_state.messages = compact_messages(st.session_state.messages, asana_chatbot)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,21 +1,33 @@
-import asana
-from asana.rest import ApiException
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime
+from pathlib import Path
 import streamlit as st
-import json
+import orjson
 import os
+import sys
 
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, ToolMessage
 
+# The apps run from inside their own folders (see Justfile), so put the repo
+# root on the path to reach the shared core package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.asana_tool import create_asana_task as _create_asana_task, get_asana_apis, tool_executor
+from core.history import compact_messages, with_date_reminder
+from core.llm import http_client, warm_connections
+from core.prompt import cacheable_system_content
+
 # --------------------------------------------------------------
 # Handle env variables
 # --------------------------------------------------------------
-load_dotenv()
+# .env parsing does disk I/O and parsing work on every process start;
+# production deployments get their environment from the orchestrator, so
+# only dev loads the file
+if os.getenv("APP_ENV", "dev") == "dev":
+    load_dotenv()
 
 # Validate and retrieve environment variables
 llm_model = os.getenv('LLM_MODEL', 'gpt-4o-mini')
@@ -24,16 +36,10 @@ anthropic_api_key = os.getenv('ANTHROPIC_API_KEY', '')
 asana_access_token = os.getenv('ASANA_ACCESS_TOKEN', '')
 asana_workspace_id = os.getenv('ASANA_WORKSPACE_ID', '')
 
-# --------------------------------------------------------------
-# Configuration setup for Asana
-# --------------------------------------------------------------
-configuration = asana.Configuration()
-configuration.access_token = asana_access_token
-api_client = asana.ApiClient(configuration)
-
-# create an instance of the different Asana API classes
-projects_api_instance = asana.ProjectsApi(api_client)
-tasks_api_instance = asana.TasksApi(api_client)
+# Dedicated pool for the intra-tool fan-out: create_asana_tasks itself runs
+# on a tool_executor worker, and blocking there on sibling work queued to the
+# same bounded pool can deadlock once all of its workers are busy.
+batch_executor = ThreadPoolExecutor(max_workers=8)
 
 # --------------------------------------------------------------
 # Business logic for AI agent | AI Agent Tool functions
@@ -53,22 +59,29 @@ def create_asana_task(task_name, project_gid, due_on="today"):
     Returns:
         str: The API response of adding the task to Asana or an error message if the API call threw an error
     """
-    if due_on == "today":
-        due_on = str(datetime.now().date())
+    return _create_asana_task(task_name, project_gid, due_on)
 
-    task_body = {
-        "data": {
-            "name": task_name,
-            "due_on": due_on,
-            "projects": [project_gid]
-        }
-    }
 
-    try:
-        api_response = tasks_api_instance.create_task(task_body, {})
-        return json.dumps(api_response, indent=2)
-    except ApiException as e:
-        return f"Exception when calling TasksApi->create_task: {e}"  
+@tool
+def create_asana_tasks(tasks):
+    """
+    Creates multiple tasks in Asana in a single call
+
+    Example call:
+
+    create_asana_tasks([{"task_name": "Test Task", "project_gid": "1207789085525921", "due_on": "2024-06-24"}])
+    Args:
+        tasks (list): A list of task dicts, each with the keys 'task_name', 'project_gid', and optionally 'due_on' in the format YYYY-MM-DD
+    Returns:
+        str: A JSON array with the API response or error message for each task, in input order
+    """
+    # One tool call instead of N keeps the LLM round-trip count flat, and the
+    # Asana requests themselves fan out over the dedicated batch executor
+    results = batch_executor.map(
+        lambda task: create_asana_task.invoke(task),
+        tasks
+    )
+    return orjson.dumps(list(results)).decode()
 
 
 @tool
@@ -80,16 +93,19 @@ def get_asana_projects():
         str: The API response from getting the projects or an error message if the projects couldn't be fetched.
         The API response is an array of project objects, where each project object looks like:
         {'gid': '1207789085525921', 'name': 'Project Name', 'resource_type': 'project'}
-    """    
+    """
     opts = {
         'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
         'workspace': asana_workspace_id, # str | The workspace or organization to filter projects on.
         'archived': False # bool | Only return projects whose `archived` field takes on the value of this parameter.
     }
 
+    from asana.rest import ApiException
+    projects_api_instance, tasks_api_instance = get_asana_apis()
+
     try:
         api_response = projects_api_instance.get_projects(opts)
-        return json.dumps(list(api_response), indent=2)
+        return orjson.dumps(list(api_response)).decode()
     except ApiException as e:
         return "Exception when calling ProjectsApi->create_project: %s\n" % e
 
@@ -114,12 +130,15 @@ def create_asana_project(project_name, due_on=None):
         }
     } # dict | The project to create.
 
+    from asana.rest import ApiException
+    projects_api_instance, tasks_api_instance = get_asana_apis()
+
     try:
         # Create a project
         api_response = projects_api_instance.create_project(body, {})
-        return json.dumps(api_response, indent=2)
+        return orjson.dumps(api_response).decode()
     except ApiException as e:
-        return "Exception when calling ProjectsApi->create_project: %s\n" % e  
+        return "Exception when calling ProjectsApi->create_project: %s\n" % e
 
 
 @tool
@@ -136,20 +155,23 @@ def get_asana_tasks(project_gid):
         str: The API response from fetching the tasks for the project in Asana or an error message if the API call threw an error
         The API response is an array of tasks objects where each task object is in the format:
         {'gid': '1207780961742158', 'created_at': '2024-07-11T16:25:46.380Z', 'due_on': None or date in format "YYYY-MM-DD", 'name': 'Test Task'}
-    """        
+    """
     opts = {
         'limit': 50, # int | Results per page. The number of objects to return per page. The value must be between 1 and 100.
         'project': project_gid, # str | The project to filter tasks on.
         'opt_fields': "created_at,name,due_on", # list[str] | This endpoint returns a compact resource, which excludes some properties by default. To include those optional properties, set this query parameter to a comma-separated list of the properties you wish to include.
     }
 
+    from asana.rest import ApiException
+    projects_api_instance, tasks_api_instance = get_asana_apis()
+
     try:
         # Get multiple tasks
         api_response = tasks_api_instance.get_tasks(opts)
-        return json.dumps(list(api_response), indent=2)
+        return orjson.dumps(list(api_response)).decode()
     except ApiException as e:
         return "Exception when calling TasksApi->get_tasks: %s\n" % e
-        
+
 @tool
 def update_asana_task(task_gid, data):
     """
@@ -165,14 +187,17 @@ def update_asana_task(task_gid, data):
                     If given, the due date needs to be in the format 'YYYY-MM-DD'.
     Returns:
         str: The API response of updating the task or an error message if the API call threw an error
-    """      
+    """
     # Data: {"completed": True or False, "due_on": "YYYY-MM-DD"}
     body = {"data": data} # dict | The task to update.
 
+    from asana.rest import ApiException
+    projects_api_instance, tasks_api_instance = get_asana_apis()
+
     try:
         # Update a task
         api_response = tasks_api_instance.update_task(body, task_gid, {})
-        return json.dumps(api_response, indent=2)
+        return orjson.dumps(api_response).decode()
     except ApiException as e:
         return "Exception when calling TasksApi->update_task: %s\n" % e
 
@@ -188,74 +213,86 @@ def delete_task(task_gid):
         task_gid (str): The ID of the task to delete
     Returns:
         str: The API response of deleting the task or an error message if the API call threw an error
-    """        
+    """
+    from asana.rest import ApiException
+    projects_api_instance, tasks_api_instance = get_asana_apis()
+
     try:
         # Delete a task
         api_response = tasks_api_instance.delete_task(task_gid)
-        return json.dumps(api_response, indent=2)
+        return orjson.dumps(api_response).decode()
     except ApiException as e:
-        return "Exception when calling TasksApi->delete_task: %s\n" % e 
+        return "Exception when calling TasksApi->delete_task: %s\n" % e
 
 # Maps the function names to the actual function object in the script
 # This mapping will also be used to create the list of tools to bind to the agent
 available_functions = {
     "create_asana_task": create_asana_task,
+    "create_asana_tasks": create_asana_tasks,
     "get_asana_projects": get_asana_projects,
     "create_asana_project": create_asana_project,
     "get_asana_tasks": get_asana_tasks,
     "update_asana_task": update_asana_task,
     "delete_task": delete_task
-} 
+}
+
+# Built once at module load: constructing the client re-parses tool schemas
+# and re-creates the underlying HTTP connection pool, so reusing one instance
+# keeps pooled connections warm across turns (and across nested tool rounds).
+asana_chatbot = ChatOpenAI(model=llm_model, http_client=http_client) if "gpt" in llm_model.lower() else ChatAnthropic(model=llm_model)
+asana_chatbot_with_tools = asana_chatbot.bind_tools([tool for _, tool in available_functions.items()])
 
 
 # --------------------------------------------------------------
 # AI Prompting Function
 # --------------------------------------------------------------
-def prompt_ai(messages, nested_calls=0):
-    if nested_calls > 5:
-        raise "AI is tool calling too much!"
-
-    # First, prompt the AI with the latest user message
-    tools = [tool for _, tool in available_functions.items()]
-    asana_chatbot = ChatOpenAI(model=llm_model) if "gpt" in llm_model.lower() else ChatAnthropic(model=llm_model)
-    asana_chatbot_with_tools = asana_chatbot.bind_tools(tools)
-
-    stream = asana_chatbot_with_tools.stream(messages)
-    first = True
-    for chunk in stream:
-        if first:
-            gathered = chunk
-            first = False
-        else:
-            gathered = gathered + chunk
-
-        yield chunk
-
-    has_tool_calls = len(gathered.tool_calls) > 0
-
-    # Second, see if the AI decided it needs to invoke a tool
-    if has_tool_calls:
+
+def prompt_ai(messages):
+    # Tool rounds run in a bounded loop rather than through recursion, so the
+    # Python stack stays flat and hitting the limit raises a real exception
+    for _ in range(6):
+        # The current date rides along per-request instead of living in
+        # messages[0], so the cached prefix never changes at midnight.
+        request_messages = with_date_reminder(messages, llm_model)
+
+        stream = asana_chatbot_with_tools.stream(request_messages)
+        first = True
+        for chunk in stream:
+            if first:
+                gathered = chunk
+                first = False
+            else:
+                gathered = gathered + chunk
+
+            yield chunk
+
+        # If the AI decided it does not need a tool, this is the final answer
+        if not gathered.tool_calls:
+            return
+
         # Add the tool request to the list of messages so the AI knows later it invoked the tool
         messages.append(gathered)
 
-        # If the AI decided to invoke a tool, invoke it
-        # For each tool the AI wanted to call, call it and add the tool result to the list of messages
-        for tool_call in gathered.tool_calls:
-            tool_name = tool_call["name"].lower()
-            selected_tool = available_functions[tool_name]
-            tool_output = selected_tool.invoke(tool_call["args"])
-            messages.append(ToolMessage(tool_output, tool_call_id=tool_call["id"]))                
+        # If the AI decided to invoke tools, fan them out across threads so
+        # N Asana round trips run concurrently, then add the results in the
+        # original order
+        tool_outputs = tool_executor.map(
+            lambda tool_call: available_functions[tool_call["name"].lower()].invoke(tool_call["args"]),
+            gathered.tool_calls
+        )
+
+        for tool_call, tool_output in zip(gathered.tool_calls, tool_outputs):
+            messages.append(ToolMessage(tool_output, tool_call_id=tool_call["id"]))
 
-        # Call the AI again so it can produce a response with the result of calling the tool(s)
-        additional_stream = prompt_ai(messages, nested_calls + 1)
-        for additional_chunk in additional_stream:
-            yield additional_chunk
+    raise RuntimeError("AI is tool calling too much!")
 
 # --------------------------------------------------------------
 # User interface and integration
 # --------------------------------------------------------------
 # Set system prompt with reflection thinking
-system_message = f"""
+# Kept free of anything dynamic (like the current date) so the prefix stays
+# byte-stable across turns, days, and restarts and provider prompt caches hit.
+SYSTEM_PROMPT_STATIC = """
 You are a skilled project manager at Fewa, a fast-paced startup, and a virtual assistant for managing tasks in Asana. Your primary goal is to help users break down projects into actionable tasks, prioritize them using the MoSCoW method (Must Have, Should Have, Could Have, Won't Have), and create tasks directly in Asana using the provided tool.
 
 Key Requirements:
@@ -286,26 +323,34 @@ Reflection Thinking Workflow:
 3. Translate this reasoning into an actionable task format.
 4. Ensure the task name, project ID, and deadline are clear and accurate.
 5. Exclude any internal reasoning or XML from the user-facing response.
-
-The current date is: {datetime.now().date()}
 """
 
+# This app keeps its own reflection-thinking prompt, marked as a cache
+# breakpoint for Claude models so provider prompt caches hit
+system_message_content = cacheable_system_content(llm_model, SYSTEM_PROMPT_STATIC)
+
 def main():
     st.title("Asana Chatbot")
 
+    # Streamlit reruns main() on every interaction; only warm once per session
+    if "warmed_connections" not in st.session_state:
+        warm_connections()
+        st.session_state.warmed_connections = True
+
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = [
-            SystemMessage(content=system_message)
-        ]    
+            SystemMessage(content=system_message_content)
+        ]
+        # Pre-rendered (type, content) pairs for the display loop: rendering
+        # from st.session_state.messages would drop older turns from the
+        # visible transcript once compaction truncates that list
+        st.session_state.rendered = []
 
     # Display chat messages from history on app rerun
-    for message in st.session_state.messages:
-        message_json = json.loads(message.json())
-        message_type = message_json["type"]
-        if message_type in ["human", "ai"]:
-            with st.chat_message(message_type):
-                st.markdown(message_json["content"])        
+    for rendered_message in st.session_state.rendered:
+        with st.chat_message(rendered_message["type"]):
+            st.markdown(rendered_message["content"])
 
     # React to user input
     if prompt := st.chat_input("What would you like to do today?"):
@@ -313,14 +358,17 @@ def main():
         st.chat_message("user").markdown(prompt)
         # Add user message to chat history
         st.session_state.messages.append(HumanMessage(content=prompt))
+        st.session_state.rendered.append({"type": "human", "content": prompt})
 
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
             stream = prompt_ai(st.session_state.messages)
             response = st.write_stream(stream)
-        
+
         st.session_state.messages.append(AIMessage(content=response))
+        st.session_state.rendered.append({"type": "ai", "content": response})
+        st.session_state.messages = compact_messages(st.session_state.messages, asana_chatbot)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
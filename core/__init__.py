@@ -0,0 +1,7 @@
+"""
+Shared infrastructure for the agent entry points.
+
+The four apps used to re-implement the same Asana wiring, prompt constants,
+and LLM plumbing. Keeping one copy here means they share a single HTTP
+connection pool, response cache, rate limiter, tokenizer, and tool schema.
+"""
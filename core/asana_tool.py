@@ -0,0 +1,85 @@
+"""
+Shared Asana wiring: lazy SDK construction, pooled connections, and the
+task-creation primitive every agent entry point builds on.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import os
+import re
+import threading
+
+import orjson
+
+# Shared executor for fanning tool calls out in parallel. The asana SDK is
+# synchronous, so threads collapse N round trips into roughly the slowest one.
+tool_executor = ThreadPoolExecutor(max_workers=8)
+
+# Compiled once: validating due dates with a regex avoids the per-call cost of
+# walking a strptime format string and allocating a throwaway datetime.
+_DATE_RE = re.compile(r"^(20\d{2})-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$")
+
+# Lazy singletons: importing the asana SDK pulls in a couple hundred modules
+# (~150-300 ms of startup), and sessions that never touch a tool skip the
+# cost entirely. The lock matters because tool calls arrive in parallel.
+_asana_apis = None
+_asana_lock = threading.Lock()
+
+
+def get_asana_apis():
+    """
+    Returns (ProjectsApi, TasksApi), importing and building the client on first use.
+    """
+    global _asana_apis
+    with _asana_lock:
+        if _asana_apis is None:
+            import asana
+            configuration = asana.Configuration()
+            configuration.access_token = os.getenv('ASANA_ACCESS_TOKEN', '')
+            # Size the urllib3 keep-alive pool to match the tool-call fan-out,
+            # so parallel calls share persistent connections
+            configuration.connection_pool_maxsize = 16
+            api_client = asana.ApiClient(configuration)
+            _asana_apis = (asana.ProjectsApi(api_client), asana.TasksApi(api_client))
+    return _asana_apis
+
+
+def get_tasks_api():
+    """
+    Returns the Asana TasksApi, importing and building the client on first use.
+    """
+    return get_asana_apis()[1]
+
+
+def create_asana_task(task_name, project_gid, due_on="today"):
+    """
+    Creates a task in Asana and returns the API response as compact JSON.
+
+    Args:
+        task_name (str): The name of the task in Asana
+        project_gid (str): The ID of the project to add the task to
+        due_on (str): The date the task is due as YYYY-MM-DD, or "today"
+    Returns:
+        str: The API response of adding the task, or an error message if the
+        date was malformed or the API call threw an error
+    """
+    from asana.rest import ApiException
+
+    if due_on.lower() == "today":
+        due_on = date.today().isoformat()
+    elif not _DATE_RE.match(due_on):
+        return "Invalid date format for due_on."
+
+    task_body = {
+        "data": {
+            "name": task_name,
+            "due_on": due_on,
+            "projects": [project_gid]
+        }
+    }
+
+    try:
+        api_response = get_tasks_api().create_task(task_body, {})
+        return orjson.dumps(api_response).decode()
+    except ApiException as e:
+        return f"Exception when calling TasksApi->create_task: {e}"
@@ -0,0 +1,98 @@
+"""
+Shared LangChain conversation helpers for the agent entry points.
+"""
+
+from datetime import datetime
+import json
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+
+from core.llm import clear_token_count_cache, count_tokens
+
+# Re-sending the full history every turn makes total billed tokens grow
+# O(N^2) with conversation length. Once the history crosses the budget,
+# older turns are folded into a one-message summary; the system prompt and
+# the most recent messages stay verbatim.
+MAX_HISTORY_TOKENS = 8000
+KEEP_RECENT_MESSAGES = 6
+
+
+def with_date_reminder(messages, llm_model):
+    """
+    Returns the request messages with the current date riding along.
+
+    The date stays out of messages[0] so the cached system-prompt prefix
+    never changes at midnight. OpenAI accepts a trailing system message, but
+    Anthropic rejects non-consecutive system messages, so on the Claude path
+    the date is appended as an extra text block on the latest user message
+    instead.
+
+    Args:
+        messages (list): Full conversation, system message first.
+        llm_model (str): Model name, used to pick the injection strategy.
+
+    Returns:
+        list: A new message list to send; the input list is not modified.
+    """
+    reminder = f"Current date: {datetime.now().date()}"
+
+    if "gpt" in llm_model.lower():
+        return messages + [SystemMessage(content=reminder)]
+
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if isinstance(message, HumanMessage):
+            content = message.content
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            amended = HumanMessage(content=content + [{"type": "text", "text": reminder}])
+            return messages[:index] + [amended] + messages[index + 1:]
+
+    return messages
+
+
+def compact_messages(messages, summarizer):
+    """
+    Folds older turns into a short summary once the history exceeds the budget.
+
+    Keeps the system prompt and the most recent messages verbatim and returns
+    a new list; under budget, the original list is returned unchanged.
+
+    Args:
+        messages (list): Full conversation, system message first.
+        summarizer: Chat model used to summarize the older turns.
+
+    Returns:
+        list: The original list if under budget, otherwise a new list of
+        [system message, summary message, recent messages verbatim].
+    """
+    total_tokens = sum(count_tokens(m) for m in messages)
+    if total_tokens <= MAX_HISTORY_TOKENS or len(messages) <= KEEP_RECENT_MESSAGES + 1:
+        return messages
+
+    recent_start = len(messages) - KEEP_RECENT_MESSAGES
+    # Never split a tool round: a tool result whose assistant tool-call
+    # message was summarized away would be rejected by the API
+    while recent_start > 1 and isinstance(messages[recent_start], ToolMessage):
+        recent_start -= 1
+
+    older_messages = messages[1:recent_start]
+
+    try:
+        summary_response = summarizer.invoke([
+            SystemMessage(content="Summarize the following conversation between a user and a project-management assistant. Keep task names, due dates, IDs, and decisions. Stay under 300 words."),
+            HumanMessage(content=json.dumps([m.model_dump() for m in older_messages], default=str))
+        ])
+        summary = summary_response.content
+    except Exception:
+        # Keep the full history rather than dropping context on a failure
+        return messages
+
+    # Compaction is rare; dropping the memo wholesale keeps it from holding
+    # on to content of summarized-away messages
+    clear_token_count_cache()
+
+    return [
+        messages[0],
+        SystemMessage(content=f"Summary of earlier conversation: {summary}")
+    ] + messages[recent_start:]
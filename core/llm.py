@@ -0,0 +1,235 @@
+"""
+Shared LLM-side infrastructure: pooled HTTP client, connection warmup,
+client-side rate limiting, token counting, and the on-disk response cache.
+"""
+
+from collections import deque
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import httpx
+import tiktoken
+
+# Shared pooled HTTP client: connections established by the startup warmup
+# are reused by later chat-completions calls on the OpenAI path.
+http_client = httpx.Client(
+    limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=60)
+)
+
+
+def warm_connections():
+    """
+    Pre-establishes a keep-alive connection to the OpenAI API.
+
+    Runs in a daemon thread so startup is not blocked; a cold TLS handshake
+    costs ~200-400 ms, which the first user turn then no longer pays. Only
+    OpenAI is warmed because only the OpenAI clients are built on the shared
+    pool above — ChatAnthropic and the asana SDK manage their own connection
+    pools, so warming those hosts here would open connections nothing reuses.
+    """
+    def _warm():
+        try:
+            http_client.head("https://api.openai.com/v1/models", timeout=5)
+        except httpx.HTTPError:
+            pass
+
+    threading.Thread(target=_warm, daemon=True).start()
+
+
+# --------------------------------------------------------------
+# Client-side rate limiting
+# --------------------------------------------------------------
+
+class RateLimiter:
+    """
+    Request and token budget enforced before each LLM call.
+
+    Keeps deques of timestamps for the trailing minute and blocks until the
+    window has capacity, so bursty workloads throttle proactively instead of
+    wasting a round trip on a 429 and its retry.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_times = deque()
+        self.token_spends = deque()
+        self.lock = threading.Lock()
+
+    def wait(self, tokens: int) -> None:
+        """
+        Blocks until one request costing the given tokens fits the window.
+
+        Args:
+            tokens (int): Estimated input tokens of the upcoming request.
+
+        Raises:
+            ValueError: If the request alone exceeds the per-minute token
+                budget and therefore could never be admitted.
+        """
+        # A request bigger than the whole budget can never fit, even with an
+        # empty window; fail fast instead of sleeping forever.
+        if tokens > self.tokens_per_minute:
+            raise ValueError(
+                f"Request of ~{tokens} estimated tokens exceeds the "
+                f"{self.tokens_per_minute} tokens-per-minute budget"
+            )
+
+        while True:
+            with self.lock:
+                now = time.time()
+                while self.request_times and now - self.request_times[0] > 60:
+                    self.request_times.popleft()
+                while self.token_spends and now - self.token_spends[0][0] > 60:
+                    self.token_spends.popleft()
+
+                tokens_spent = sum(spend for _, spend in self.token_spends)
+                if (len(self.request_times) < self.requests_per_minute
+                        and tokens_spent + tokens <= self.tokens_per_minute):
+                    self.request_times.append(now)
+                    self.token_spends.append((now, tokens))
+                    return
+
+                oldest = min(
+                    self.request_times[0] if self.request_times else now,
+                    self.token_spends[0][0] if self.token_spends else now
+                )
+
+            # Sleep until the oldest window entry expires, then re-check
+            time.sleep(max(0.05, 60 - (time.time() - oldest)))
+
+
+rate_limiter = RateLimiter(
+    requests_per_minute=int(os.getenv('RPM', 500)),
+    tokens_per_minute=int(os.getenv('TPM', 90000))
+)
+
+
+# --------------------------------------------------------------
+# Token counting
+# --------------------------------------------------------------
+
+# cl100k_base is only an approximation for non-OpenAI models, which is fine
+# for budgeting purposes
+token_encoding = tiktoken.get_encoding("cl100k_base")
+
+# Token counts memoized by message identity so each message is tokenized
+# once per lifetime instead of on every compaction pass; the stored content
+# reference guards against id() reuse after a message is garbage collected
+_token_count_cache = {}
+
+
+def count_tokens(message) -> int:
+    """
+    Counts the tokens in a message's content, memoized per message.
+
+    Args:
+        message: A message dict (or object with a content attribute).
+
+    Returns:
+        int: Token count of the content; 0 for empty content.
+    """
+    if isinstance(message, dict):
+        content = message.get("content")
+    else:
+        content = getattr(message, "content", None)
+
+    if not content:
+        return 0
+
+    cached = _token_count_cache.get(id(message))
+    if cached is not None and cached[0] is content:
+        return cached[1]
+
+    text = content if isinstance(content, str) else json.dumps(content, default=str)
+    count = len(token_encoding.encode(text))
+    _token_count_cache[id(message)] = (content, count)
+    return count
+
+
+def clear_token_count_cache() -> None:
+    """
+    Drops all memoized token counts.
+
+    Called on the rare compaction event so the memo does not keep the content
+    of summarized-away messages alive.
+    """
+    _token_count_cache.clear()
+
+
+# --------------------------------------------------------------
+# Exact response cache for LLM calls
+# --------------------------------------------------------------
+
+# Identical requests (same model, history, and tools) are served from a local
+# SQLite cache instead of hitting the API again — common during dev/demos.
+# One on-disk cache shared by every entry point, so hits carry across apps.
+llm_cache_path = os.getenv(
+    'LLM_CACHE_PATH',
+    str(Path.home() / ".cache" / "asana-agent" / "llm.sqlite")
+)
+llm_cache_ttl = 7 * 24 * 60 * 60  # 7 days, in seconds
+
+Path(llm_cache_path).parent.mkdir(parents=True, exist_ok=True)
+cache_connection = sqlite3.connect(llm_cache_path, check_same_thread=False)
+cache_connection.execute(
+    "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT, created_at REAL)"
+)
+cache_connection.commit()
+
+
+def cache_key(model: str, messages: list, tools: list = None) -> str:
+    """
+    Builds a deterministic cache key for a chat completion request.
+
+    Args:
+        model (str): Model name the request targets.
+        messages (list): List of conversation messages.
+        tools (list, optional): Tool schema sent with the request.
+
+    Returns:
+        str: SHA256 hex digest over the model, messages, and tool schema.
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "tools": tools},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_get(key: str) -> str | None:
+    """
+    Looks up a cached response, ignoring entries older than the TTL.
+
+    Args:
+        key (str): Cache key from cache_key().
+
+    Returns:
+        str | None: The cached response content, or None on a miss.
+    """
+    row = cache_connection.execute(
+        "SELECT response FROM llm_cache WHERE key = ? AND created_at > ?",
+        (key, time.time() - llm_cache_ttl)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def cache_set(key: str, response: str) -> None:
+    """
+    Stores a response under the given cache key.
+
+    Args:
+        key (str): Cache key from cache_key().
+        response (str): Response content to cache.
+    """
+    cache_connection.execute(
+        "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+        (key, response, time.time())
+    )
+    cache_connection.commit()
@@ -0,0 +1,57 @@
+"""
+Shared prompt and tool-schema constants.
+
+Everything here is static on purpose: byte-stable prompts and schemas are
+what make provider prompt caches (and the local response cache) hit.
+"""
+
+# Kept free of anything dynamic (like the current date) so the prefix stays
+# byte-stable across turns, days, and restarts and provider prompt caches hit.
+SYSTEM_PROMPT_STATIC = "You are an experienced project manager at Fewa, a dynamic startup. Your role is to assist users in breaking down their projects into actionable tasks, prioritizing them effectively, and creating well-structured tickets in Asana. Provide clear task descriptions, assign priority levels using the MoSCoW method, suggest aggressive yet realistic deadlines with buffer times, and categorize tasks based on user requirements and project objectives. Ensure tasks are concise, actionable, and aligned with the user's overall goals. Embody the 'move fast and break nothing' philosophy by incorporating feature flags for direct production deployment, including clear communication details, automating repetitive steps, ensuring quality assurance through code reviews, managing dependencies, efficiently tracking time, documenting changes, and utilizing predefined templates for quick task creation. When using the create_asana_task tool, pass due dates as YYYY-MM-DD; omit due_on to default the task to today."
+
+# The tool schema is constant, so it is built once. This also keeps its JSON
+# serialization byte-stable across turns, which matters for the response-cache
+# key and the provider's prompt-cache prefix hashing.
+TOOLS_SCHEMA = [
+    {
+        "type": "function",
+        "function": {
+            "name": "create_asana_task",
+            "description": "Create an Asana task",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "task_name": {
+                        "type": "string",
+                        "description": "Task name"
+                    },
+                    "due_on": {
+                        "type": "string",
+                        "description": "YYYY-MM-DD or 'today'"
+                    },
+                },
+                "required": ["task_name"]
+            },
+        },
+    }
+]
+
+
+def cacheable_system_content(llm_model, prompt=SYSTEM_PROMPT_STATIC):
+    """
+    Returns system-message content suited to the configured model.
+
+    Anthropic bills cached prompt reads at ~10% of the input price and skips
+    prefill on them, so for Claude the prompt is wrapped in a text block
+    marked as a cache breakpoint. OpenAI caches stable prefixes
+    automatically, so a plain string is enough there.
+    """
+    if "gpt" in llm_model.lower():
+        return prompt
+    return [
+        {
+            "type": "text",
+            "text": prompt,
+            "cache_control": {"type": "ephemeral"},
+        }
+    ]